@@ -1,5 +1,8 @@
 from flask import Flask, request, render_template, jsonify, flash, redirect, url_for
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from google.generativeai.client import get_default_file_client
+from google.generativeai.types import file_types
 import io
 import httpx
 import os
@@ -12,6 +15,11 @@ from pathlib import Path
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
 import platform
+import shutil
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
@@ -37,6 +45,53 @@ SUPPORTED_FORMATS = {
     '.doc': 'application/msword'
 }
 
+# Maximum number of documents in one applicant bundle, and how many of them are
+# converted and uploaded at the same time
+MAX_BUNDLE_FILES = int(os.environ.get('MAX_BUNDLE_FILES', '10'))
+BUNDLE_UPLOAD_WORKERS = 4
+
+# Deadline covering a whole request (download, upload, processing and generation), in seconds
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', '120'))
+
+# Hedged generation: when enabled, a generate_content call still running after the
+# HEDGE_PERCENTILE latency of recent calls gets a duplicate request, and whichever
+# finishes first is used. Hedging starts once HEDGE_MIN_SAMPLES latencies are recorded.
+HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'false').lower() == 'true'
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '95'))
+HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', '20'))
+HEDGE_MAX_IN_FLIGHT = int(os.environ.get('HEDGE_MAX_IN_FLIGHT', '4'))
+
+# Worker threads for Google AI calls, so a stuck call never blocks a request past its
+# deadline. Calls are not cancelled once started, so each kind of call has its own pool:
+# stuck uploads, hedges and background deletes cannot starve first-attempt generations.
+UPLOAD_WORKERS = 16
+upload_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS)
+generation_executor = ThreadPoolExecutor(max_workers=32)
+hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_IN_FLIGHT)
+cleanup_executor = ThreadPoolExecutor(max_workers=4)
+hedge_slots = threading.BoundedSemaphore(HEDGE_MAX_IN_FLIGHT)
+
+# Recent generation latencies and hedging counters, kept per model and kind of call
+# (single file or bundle) as their latencies differ widely
+generation_stats = {}
+stats_lock = threading.Lock()
+
+# Calls abandoned at their deadline: currently still holding an upload worker, and in total
+abandoned_calls = {
+    'running': 0,
+    'total': 0
+}
+
+
+class BundleDocumentError(Exception):
+    """Raised when one or more documents of a bundle could not be uploaded"""
+    def __init__(self, failures):
+        # failures is a list of (filename, error) tuples
+        self.failures = failures
+        super().__init__('Could not process ' + ', '.join(
+            f"{filename}: {str(error)}" for filename, error in failures
+        ))
+
 
 def convert_to_camel_case(text):
     """Convert a string to camelCase format"""
@@ -110,6 +165,23 @@ def validate_file_format(filename):
     file_extension = Path(filename).suffix.lower()
     return file_extension in SUPPORTED_FORMATS
 
+def get_unique_filename(filename, used_names):
+    """Get a secure, non-empty filename that is not in used_names"""
+    file_extension = Path(filename).suffix.lower()
+    secure_name = secure_filename(filename)
+    
+    # secure_filename can return an empty name or drop the extension
+    if not secure_name.lower().endswith(file_extension):
+        secure_name = f"document{file_extension}"
+    
+    unique_name = secure_name
+    counter = 1
+    while unique_name in used_names:
+        counter += 1
+        unique_name = f"{counter}_{secure_name}"
+    
+    return unique_name
+
 def convert_with_python_docx(docx_path, pdf_path):
     """Fallback method using python-docx and reportlab"""
     try:
@@ -145,8 +217,31 @@ def convert_with_python_docx(docx_path, pdf_path):
     except Exception as e:
         raise Exception(f"python-docx conversion failed: {str(e)}")
 
-def convert_docx_to_pdf(docx_path):
-    """Convert DOCX file to PDF and return the PDF path"""
+def run_libreoffice(command, docx_path, pdf_path, timeout=60):
+    """Run a headless LibreOffice conversion with its own user profile.
+
+    Parallel runs sharing the default profile interfere with each other, so
+    each run gets a temporary profile directory.
+    """
+    import subprocess
+    profile_dir = tempfile.mkdtemp()
+    try:
+        return subprocess.run([
+            command, f'-env:UserInstallation={Path(profile_dir).as_uri()}',
+            '--headless', '--convert-to', 'pdf',
+            '--outdir', os.path.dirname(pdf_path), docx_path
+        ], capture_output=True, text=True, timeout=timeout)
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+
+def get_conversion_timeout(deadline):
+    """Get the timeout for one conversion step, raising TimeoutError once the deadline has passed"""
+    if deadline is None:
+        return 60
+    return min(60, get_remaining_time(deadline))
+
+def convert_docx_to_pdf(docx_path, deadline=None):
+    """Convert DOCX file to PDF and return the PDF path, raising TimeoutError after the deadline"""
     try:
         # Create a temporary PDF file path
         pdf_path = docx_path.replace('.docx', '.pdf').replace('.doc', '.pdf')
@@ -154,6 +249,8 @@ def convert_docx_to_pdf(docx_path):
         # Check if running on Windows (docx2pdf works best on Windows)
         if platform.system() == 'Windows':
             try:
+                get_conversion_timeout(deadline)
+                
                 # Try to initialize COM before using docx2pdf
                 try:
                     import pythoncom
@@ -171,6 +268,8 @@ def convert_docx_to_pdf(docx_path):
                 if com_initialized:
                     pythoncom.CoUninitialize()
                 
+            except TimeoutError:
+                raise
             except Exception as e:
                 print(f"docx2pdf failed: {e}")
                 # If docx2pdf fails, try LibreOffice method
@@ -182,10 +281,7 @@ def convert_docx_to_pdf(docx_path):
                     conversion_successful = False
                     for cmd in libreoffice_commands:
                         try:
-                            result = subprocess.run([
-                                cmd, '--headless', '--convert-to', 'pdf', 
-                                '--outdir', os.path.dirname(pdf_path), docx_path
-                            ], capture_output=True, text=True, timeout=60)
+                            result = run_libreoffice(cmd, docx_path, pdf_path, get_conversion_timeout(deadline))
                             
                             if result.returncode == 0:
                                 conversion_successful = True
@@ -196,24 +292,25 @@ def convert_docx_to_pdf(docx_path):
                     if not conversion_successful:
                         raise Exception("LibreOffice conversion failed or not found")
                         
+                except TimeoutError:
+                    raise
                 except (subprocess.TimeoutExpired, FileNotFoundError, Exception):
                     # Fall back to python-docx + reportlab method
+                    get_conversion_timeout(deadline)
                     print("LibreOffice not available, using python-docx + reportlab...")
                     convert_with_python_docx(docx_path, pdf_path)
         else:
             # For Linux/Mac, try using LibreOffice command line first
             try:
                 import subprocess
-                result = subprocess.run([
-                    'libreoffice', '--headless', '--convert-to', 'pdf', 
-                    '--outdir', os.path.dirname(pdf_path), docx_path
-                ], capture_output=True, text=True, timeout=60)
+                result = run_libreoffice('libreoffice', docx_path, pdf_path, get_conversion_timeout(deadline))
                 
                 if result.returncode != 0:
                     raise Exception(f"LibreOffice conversion failed: {result.stderr}")
                     
             except (subprocess.TimeoutExpired, FileNotFoundError):
                 # If LibreOffice is not available, use python-docx + reportlab
+                get_conversion_timeout(deadline)
                 print("LibreOffice not available, using python-docx + reportlab...")
                 convert_with_python_docx(docx_path, pdf_path)
         
@@ -222,25 +319,15 @@ def convert_docx_to_pdf(docx_path):
             
         return pdf_path
         
+    except TimeoutError:
+        raise
     except Exception as e:
         raise Exception(f"Error converting DOCX to PDF: {str(e)}")
 
-def get_prompt_for_file_type(file_path):
-    """Get appropriate prompt based on file type"""
-    file_extension = Path(file_path).suffix.lower()
-    
-    if file_extension in ['.pdf', '.docx', '.doc']:
-        return """
-        You are an intelligent information extractor. Carefully extract all relevant details from the given document and return ONLY a clean JSON object. Do not include any markdown formatting, code blocks, or explanatory text.
-
-        ⚠️ Important:
-        - Return ONLY valid JSON without any ```json``` code blocks or extra formatting
-        - ONLY include fields that are explicitly mentioned or can be confidently extracted from the document
-        - Do NOT include any field in the JSON if the information is missing, unavailable, or unclear
-
-        Extract the following and return as a JSON object:
-
-        1. **Personal Information**:
+def get_applicant_prompt_sections(first_number, address_note):
+    """Get the numbered applicant sections shared by the single file and bundle prompts"""
+    n = first_number
+    return f"""        {n}. **Personal Information**:
         - First Name 
         - Last Name
         - Gender
@@ -252,14 +339,14 @@ def get_prompt_for_file_type(file_path):
         - Email Address (consider only personal Email - Do not consider lecturer or institute email as personal email)
         - Phone Number
 
-        2. **Address Details** (Do not include the Test Center as Address):
+        {n + 1}. **Address Details** ({address_note}):
         - Country (Even using the city you can)
         - Province / State
         - City (Even if Board is given there you will find the city)
         - Postal / Zip Code
         - Home Address
 
-        3. **Emergency Contact**:
+        {n + 2}. **Emergency Contact**:
         - Name
         - Email Address
         - Relation with Applicant
@@ -270,7 +357,7 @@ def get_prompt_for_file_type(file_path):
         - Postal / Zip Code
         - Home Address
 
-        4. **Academic History** (May include multiple records):
+        {n + 3}. **Academic History** (May include multiple records):
         - Obtain Degree (if applicablek)
         - Roll Number
         - Total number
@@ -285,18 +372,35 @@ def get_prompt_for_file_type(file_path):
         - Program End Date
         - Program Duration
 
-        5. **English Proficiency Test**:
+        {n + 4}. **English Proficiency Test**:
         - Exam Type (e.g., IELTS, LanguageCert, PTE, Duolingo, TOEFL)
         - Date of Exam
         - Overall Score
         - Sectional Scores (Listening, Reading, Writing, Speaking)
         - Valid Until
-        - Issue Date
+        - Issue Date"""
+
+def get_prompt_for_file_type(file_path):
+    """Get appropriate prompt based on file type"""
+    file_extension = Path(file_path).suffix.lower()
+    
+    if file_extension in ['.pdf', '.docx', '.doc']:
+        return f"""
+        You are an intelligent information extractor. Carefully extract all relevant details from the given document and return ONLY a clean JSON object. Do not include any markdown formatting, code blocks, or explanatory text.
+
+        ⚠️ Important:
+        - Return ONLY valid JSON without any ```json``` code blocks or extra formatting
+        - ONLY include fields that are explicitly mentioned or can be confidently extracted from the document
+        - Do NOT include any field in the JSON if the information is missing, unavailable, or unclear
+
+        Extract the following and return as a JSON object:
+
+{get_applicant_prompt_sections(1, 'Do not include the Test Center as Address')}
 
         Return ONLY the JSON object with extracted data. No explanations, no code blocks, just clean JSON.
         """
     elif file_extension in ['.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.tiff', '.tif']:
-        return """
+        return f"""
         You are an intelligent image analyzer and OCR specialist. Analyze the given image and extract all relevant text and information. Return ONLY a clean JSON object without any markdown formatting or code blocks.
 
         ⚠️ Important:
@@ -309,58 +413,7 @@ def get_prompt_for_file_type(file_path):
 
         1. **Document Type**: (e.g., ID Card, Passport, Driver's License, Certificate, Form, etc.)
 
-        2. **Personal Information**:
-        - First Name 
-        - Last Name
-        - Gender
-        - Nationality
-        - Current Country of Residence
-        - Date of Birth
-        - Passport Number
-        - Passport Expiry Date
-        - Email Address (consider only personal Email - Do not consider lecturer or institute email as personal email)
-        - Phone Number
-
-        3. **Address Details** (Do not include the Test Center as Address, Do not include educational address):
-        - Country (Even using the city you can)
-        - Province / State
-        - City (Even if Board is given there you will find the city)
-        - Postal / Zip Code
-        - Home Address
-
-        4. **Emergency Contact**:
-        - Name
-        - Email Address
-        - Relation with Applicant
-        - Phone Number
-        - Country 
-        - Province / State
-        - City
-        - Postal / Zip Code
-        - Home Address
-
-        5. **Academic History** (May include multiple records):
-        - Obtain Degree (if applicablek)
-        - Roll Number
-        - Total number
-        - Obtain number
-        - Country of Education
-        - Level of Education (e.g., Secondary (SSC / O Levels / Level 2 Diploma), HSSC / A Levels / Level 3 Diploma, Diploma Qualification (HNC / Level 4, HND / Level 5), Undergraduate, Postgraduate)
-        - Diploma Qualification (if applicable)
-        - Grading Scheme (e.g., CGPA, Grade, Percentage)
-        - Grade Average
-        - Institute Name 
-        - Program Start Date
-        - Program End Date
-        - Program Duration
-
-        6. **English Proficiency Test**:
-        - Exam Type (e.g., IELTS, LanguageCert, PTE, Duolingo, TOEFL)
-        - Date of Exam
-        - Overall Score
-        - Sectional Scores (Listening, Reading, Writing, Speaking)
-        - Valid Until
-        - Issue Date
+{get_applicant_prompt_sections(2, 'Do not include the Test Center as Address, Do not include educational address')}
 
 
         7. **Additional Information**:
@@ -377,87 +430,431 @@ def get_prompt_for_file_type(file_path):
         Return ONLY valid JSON without any ```json``` code blocks or extra formatting.
         """
 
-def process_file_with_gemini(file_path, prompt_text, filename):
-    """Process a file with Google's Gemini AI model"""
+def get_bundle_prompt(file_paths):
+    """Get the prompt that merges all documents of one applicant into a single record"""
+    return f"""
+        You are an intelligent information extractor. You are given {len(file_paths)} documents that all belong to the same applicant. Each document is preceded by a line "Document: <name>". Carefully read every document and return ONLY one clean JSON object describing the applicant. Do not include any markdown formatting, code blocks, or explanatory text.
+
+        ⚠️ Important:
+        - Return ONLY valid JSON without any ```json``` code blocks or extra formatting
+        - Merge the information from all documents into ONE applicant record
+        - Deduplicate: information that appears in several documents (including the same academic record or test) must appear only once
+        - If documents disagree, prefer the most authoritative one (e.g., Passport for personal details, transcripts or certificates for academic history, test report for English proficiency)
+        - ONLY include fields that are explicitly mentioned or can be confidently extracted from the documents
+        - Do NOT include any field in the JSON if the information is missing, unavailable, or unclear
+        - Every extracted field must be an object with exactly two keys: "value" (the extracted value) and "source" (the name of the document it was taken from, exactly as given in its "Document:" line)
+
+        Extract the following and return as a JSON object:
+
+{get_applicant_prompt_sections(1, 'Do not include the Test Center as Address, Do not include educational address')}
+
+        Return ONLY the JSON object with extracted data. No explanations, no code blocks, just clean JSON.
+        """
+
+def get_request_deadline():
+    """Get the deadline for a request starting now"""
+    return time.monotonic() + REQUEST_DEADLINE_SECONDS
+
+def get_remaining_time(deadline):
+    """Get the seconds left before the deadline, raising TimeoutError once it has passed"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Request deadline exceeded")
+    return remaining
+
+def finish_abandoned_call(future, on_abandoned):
+    """Release an abandoned call once it finishes, cleaning up after it if it succeeded"""
+    with stats_lock:
+        abandoned_calls['running'] -= 1
+
+    if on_abandoned and future.exception() is None:
+        on_abandoned(future.result())
+
+def call_with_deadline(deadline, func, *args, on_abandoned=None, **kwargs):
+    """Run a blocking Google AI call that accepts no timeout, giving up once the deadline passes.
+
+    The call runs on upload_executor. A call still running at the deadline cannot
+    be cancelled: it keeps its worker until it finishes and is counted in
+    abandoned_calls. on_abandoned is called with its result if it still succeeds.
+    """
+    future = upload_executor.submit(func, *args, **kwargs)
+    try:
+        return future.result(timeout=get_remaining_time(deadline))
+    except (FutureTimeoutError, TimeoutError):
+        # Drop the call if it has not started yet, otherwise clean up after it
+        if not future.cancel():
+            with stats_lock:
+                abandoned_calls['running'] += 1
+                abandoned_calls['total'] += 1
+            print(f"Warning: {getattr(func, '__name__', 'call')} abandoned at the deadline, it keeps an upload worker until it finishes")
+            future.add_done_callback(lambda done: finish_abandoned_call(done, on_abandoned))
+        raise TimeoutError("Request deadline exceeded")
+
+def get_abandoned_call_stats():
+    """Get counts of calls abandoned at their deadline"""
+    with stats_lock:
+        stats = dict(abandoned_calls)
+    stats['upload_workers'] = UPLOAD_WORKERS
+    return stats
+
+def get_file_with_deadline(name, deadline):
+    """Get an uploaded file's current state, timing out at the deadline.
+
+    genai.get_file accepts no timeout, so this goes through the file client directly.
+    """
+    try:
+        file_proto = get_default_file_client().get_file(name=name, timeout=get_remaining_time(deadline))
+    except google_exceptions.DeadlineExceeded:
+        raise TimeoutError("Request deadline exceeded")
+    return file_types.File(file_proto)
+
+def download_with_deadline(file_url, deadline):
+    """Download a file and return its content and headers, raising TimeoutError after the deadline.
+
+    httpx timeouts only bound each read, so the deadline is checked after every
+    chunk as well to stop servers that trickle bytes.
+    """
+    try:
+        with httpx.stream('GET', file_url, follow_redirects=True, timeout=get_remaining_time(deadline)) as response:
+            response.raise_for_status()
+            content = io.BytesIO()
+            for chunk in response.iter_bytes():
+                get_remaining_time(deadline)
+                content.write(chunk)
+            return content.getvalue(), response.headers
+    except httpx.TimeoutException:
+        raise TimeoutError("Request deadline exceeded")
+
+def delete_uploaded_file(uploaded_file):
+    """Delete an uploaded file from Google AI in the background"""
+    def delete():
+        try:
+            genai.delete_file(uploaded_file.name)
+        except Exception as e:
+            print(f"Warning: Could not delete uploaded file: {str(e)}")
+
+    cleanup_executor.submit(delete)
+
+def get_generation_stats(key):
+    """Get the latency history and hedging counters for a kind of call (stats_lock must be held)"""
+    if key not in generation_stats:
+        generation_stats[key] = {
+            'latencies': deque(maxlen=500),
+            'generations': 0,
+            'hedges_fired': 0,
+            'hedge_wins': 0,
+            'hedge_wasted_tokens': 0
+        }
+    return generation_stats[key]
+
+def get_hedge_delay(key):
+    """Get how long to wait before hedging a kind of call, or None if hedging is off"""
+    if not HEDGE_ENABLED:
+        return None
+
+    with stats_lock:
+        latencies = sorted(get_generation_stats(key)['latencies'])
+
+    if len(latencies) < HEDGE_MIN_SAMPLES:
+        return None
+
+    index = min(len(latencies) - 1, int(len(latencies) * HEDGE_PERCENTILE / 100))
+    return latencies[index]
+
+def get_hedge_stats():
+    """Get hedging counters per kind of call for tuning HEDGE_PERCENTILE"""
+    calls = {}
+    with stats_lock:
+        for key, stats in generation_stats.items():
+            calls[key] = {name: value for name, value in stats.items() if name != 'latencies'}
+            calls[key]['recorded_latencies'] = len(stats['latencies'])
+
+    for key, stats in calls.items():
+        stats['hedge_delay_seconds'] = get_hedge_delay(key)
+        stats['hedge_rate'] = stats['hedges_fired'] / stats['generations'] if stats['generations'] else 0.0
+
+    return {
+        'enabled': HEDGE_ENABLED,
+        'percentile': HEDGE_PERCENTILE,
+        'max_in_flight': HEDGE_MAX_IN_FLIGHT,
+        'calls': calls
+    }
+
+def record_wasted_tokens(key, future):
+    """Count the tokens spent by a call of a hedged generation whose response was not used"""
+    if future.cancelled() or future.exception() is not None:
+        return
+
+    usage = getattr(future.result(), 'usage_metadata', None)
+    if usage:
+        with stats_lock:
+            get_generation_stats(key)['hedge_wasted_tokens'] += usage.total_token_count
+
+def run_when_finished(futures, callback):
+    """Run callback once every future has finished"""
+    if not futures:
+        callback()
+        return
+
+    pending = [len(futures)]
+    lock = threading.Lock()
+
+    def on_done(_):
+        with lock:
+            pending[0] -= 1
+            finished = pending[0] == 0
+        if finished:
+            callback()
+
+    for future in futures:
+        future.add_done_callback(on_done)
+
+def generate_with_deadline(model, contents, deadline, kind, on_finished):
+    """Generate content before the deadline, hedging slow calls if enabled.
+
+    kind ('single' or 'bundle') and the model name select the latency history
+    used for hedging. on_finished is called once every generate_content call
+    made here has finished, so uploaded files are not deleted under a hedge
+    that is still running.
+    """
+    key = f"{model.model_name}:{kind}"
+    calls = []
+    started = time.monotonic()
+
+    def generate():
+        try:
+            return model.generate_content(
+                contents,
+                request_options={'timeout': get_remaining_time(deadline)}
+            )
+        except google_exceptions.DeadlineExceeded:
+            raise TimeoutError("Request deadline exceeded")
+
+    with stats_lock:
+        get_generation_stats(key)['generations'] += 1
+
+    try:
+        hedge_delay = get_hedge_delay(key)
+        calls.append(generation_executor.submit(generate))
+
+        # Hedge only if the duplicate can still finish before the deadline
+        if hedge_delay is not None and hedge_delay < get_remaining_time(deadline):
+            done, _ = wait(calls, timeout=hedge_delay)
+
+            # The call is slower than usual - send a duplicate unless too many are running
+            if not done and hedge_slots.acquire(blocking=False):
+                hedge = hedge_executor.submit(generate)
+                hedge.add_done_callback(lambda _: hedge_slots.release())
+                calls.append(hedge)
+                with stats_lock:
+                    get_generation_stats(key)['hedges_fired'] += 1
+
+        # Take the first call to succeed
+        winner = None
+        error = None
+        pending = set(calls)
+        while pending and winner is None:
+            done, pending = wait(pending, timeout=get_remaining_time(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("Request deadline exceeded")
+            for future in done:
+                if future.exception() is None:
+                    winner = future
+                    break
+                error = future.exception()
+        if winner is None:
+            raise error
+
+        if len(calls) > 1:
+            for future in calls:
+                if future is not winner:
+                    future.add_done_callback(lambda done: record_wasted_tokens(key, done))
+            if winner is not calls[0]:
+                with stats_lock:
+                    get_generation_stats(key)['hedge_wins'] += 1
+
+        # One sample per request, measured from when the primary call started
+        with stats_lock:
+            get_generation_stats(key)['latencies'].append(time.monotonic() - started)
+
+        return winner.result()
+
+    except TimeoutError:
+        # Requests that miss the deadline count as taking the whole deadline
+        with stats_lock:
+            get_generation_stats(key)['latencies'].append(deadline - started)
+        raise
+
+    finally:
+        run_when_finished(calls, on_finished)
+
+def remove_converted_pdf(pdf_path):
+    """Delete a temporary PDF created by DOCX conversion, if any"""
+    if pdf_path:
+        try:
+            os.unlink(pdf_path)
+        except Exception as e:
+            print(f"Warning: Could not delete temporary PDF file: {str(e)}")
+
+def upload_file_to_gemini(file_path, filename, deadline):
+    """Convert a file if needed, upload it to Google AI and wait until it is ready.
+
+    The file is uploaded from memory, so temporary files can be removed even if
+    an abandoned upload is still running. Raises TimeoutError if the file is not
+    ready before the deadline.
+    """
+    converted_path = None
+    
     try:
-        original_file_path = file_path
-        pdf_converted = False
-        
         # Check if it's a DOCX file and convert to PDF
         file_extension = Path(file_path).suffix.lower()
         if file_extension in ['.docx', '.doc']:
             try:
                 print(f"Converting {file_extension} to PDF...")
-                pdf_path = convert_docx_to_pdf(file_path)
+                pdf_path = convert_docx_to_pdf(file_path, deadline)
+                if pdf_path != file_path:
+                    converted_path = pdf_path
                 file_path = pdf_path  # Use the converted PDF path
-                pdf_converted = True
+                mime_type = 'application/pdf'
                 print("Conversion successful!")
+            except TimeoutError:
+                raise
             except Exception as e:
                 print(f"Warning: Could not convert {file_extension} to PDF: {str(e)}")
                 print("Proceeding with original file...")
-        
-        # Get MIME type (use PDF mime type if converted)
-        if pdf_converted:
-            mime_type = 'application/pdf'
+                mime_type = get_file_mime_type(file_path)
         else:
             mime_type = get_file_mime_type(file_path)
         
-        # Upload the file to Google AI
-        uploaded_file = genai.upload_file(
-            path=file_path,
+        with open(file_path, 'rb') as f:
+            file_content = io.BytesIO(f.read())
+        
+        # Upload the file to Google AI, deleting it if it only finishes after the deadline
+        uploaded_file = call_with_deadline(
+            deadline,
+            genai.upload_file,
+            path=file_content,
             mime_type=mime_type,
-            display_name=filename
+            display_name=filename,
+            on_abandoned=delete_uploaded_file
         )
         
         # Wait for the file to be processed
         while uploaded_file.state.name == "PROCESSING":
-            time.sleep(2)
-            uploaded_file = genai.get_file(uploaded_file.name)
+            try:
+                time.sleep(min(2, get_remaining_time(deadline)))
+                uploaded_file = get_file_with_deadline(uploaded_file.name, deadline)
+            except TimeoutError:
+                delete_uploaded_file(uploaded_file)
+                raise
         
         if uploaded_file.state.name == "FAILED":
             raise ValueError(f"File processing failed: {uploaded_file.state}")
         
+        return uploaded_file
+        
+    finally:
+        # Clean up converted PDF if it was created
+        remove_converted_pdf(converted_path)
+
+def process_file_with_gemini(file_path, prompt_text, filename, deadline=None):
+    """Process a file with Google's Gemini AI model, raising TimeoutError after the deadline"""
+    if deadline is None:
+        deadline = get_request_deadline()
+    
+    try:
+        uploaded_file = upload_file_to_gemini(file_path, filename, deadline)
+        
         # Initialize the model
         # model = genai.GenerativeModel('gemini-1.5-flash')
         model = genai.GenerativeModel('gemini-2.0-flash')
         # model = genai.GenerativeModel('gemini-2.5-pro')
 
         
-        # Generate content with the uploaded file
-        response = model.generate_content([uploaded_file, prompt_text])
-        
-        # Clean up - delete the uploaded file
-        genai.delete_file(uploaded_file.name)
-        
-        # Clean up converted PDF if it was created
-        if pdf_converted and file_path != original_file_path:
-            try:
-                os.unlink(file_path)
-            except Exception as e:
-                print(f"Warning: Could not delete temporary PDF file: {str(e)}")
+        # Generate content with the uploaded file, deleting it once every call has finished
+        response = generate_with_deadline(
+            model, [uploaded_file, prompt_text], deadline, 'single',
+            on_finished=lambda: delete_uploaded_file(uploaded_file)
+        )
         
         return response.text
         
+    except TimeoutError:
+        raise
     except Exception as e:
-        # Clean up files in case of error
-        if 'pdf_converted' in locals() and pdf_converted and 'file_path' in locals() and file_path != original_file_path:
-            try:
-                os.unlink(file_path)
-            except:
-                pass
         return f"Error processing file: {str(e)}"
 
-def process_url_with_gemini(file_url, prompt_text):
-    """Process a file from URL with Google's Gemini AI model"""
+def process_bundle_with_gemini(file_entries, prompt_text, deadline=None):
+    """Process all documents of one applicant with a single Gemini call.
+
+    file_entries is a list of (file_path, filename) tuples. The files are
+    converted and uploaded in parallel and sent as separate parts of one
+    generate_content request, each preceded by a label naming the document.
+    Raises BundleDocumentError naming the documents that could not be uploaded.
+    """
+    uploads = []
+    generation_started = False
+    if deadline is None:
+        deadline = get_request_deadline()
+    
+    def delete_uploads():
+        for uploaded_file in uploads:
+            delete_uploaded_file(uploaded_file)
+    
+    try:
+        # Convert and upload every document in parallel
+        with ThreadPoolExecutor(max_workers=min(len(file_entries), BUNDLE_UPLOAD_WORKERS)) as executor:
+            futures = [
+                executor.submit(upload_file_to_gemini, file_path, filename, deadline)
+                for file_path, filename in file_entries
+            ]
+            wait(futures)
+        
+        failures = []
+        for future, (_, filename) in zip(futures, file_entries):
+            if future.exception() is None:
+                uploads.append(future.result())
+            else:
+                failures.append((filename, future.exception()))
+        if any(isinstance(error, TimeoutError) for _, error in failures):
+            raise TimeoutError("Request deadline exceeded")
+        if failures:
+            raise BundleDocumentError(failures)
+        
+        # Label each document so the model can attribute fields to their source
+        contents = []
+        for uploaded_file, (_, filename) in zip(uploads, file_entries):
+            contents.append(f"Document: {filename}")
+            contents.append(uploaded_file)
+        contents.append(prompt_text)
+        
+        # Initialize the model
+        model = genai.GenerativeModel('gemini-2.0-flash')
+        
+        # Generate one merged record from all documents, deleting them once every call has finished
+        generation_started = True
+        response = generate_with_deadline(model, contents, deadline, 'bundle', on_finished=delete_uploads)
+        
+        return response.text
+        
+    finally:
+        # Clean up - delete the uploaded files if generation never started
+        if not generation_started:
+            delete_uploads()
+
+def process_url_with_gemini(file_url, prompt_text, deadline=None):
+    """Process a file from URL with Google's Gemini AI model, raising TimeoutError after the deadline"""
+    if deadline is None:
+        deadline = get_request_deadline()
+    
     try:
         # Download the file
-        response = httpx.get(file_url, follow_redirects=True)
-        response.raise_for_status()
+        content, headers = download_with_deadline(file_url, deadline)
         
         # Determine file extension from URL or content type
         file_extension = Path(file_url).suffix.lower()
         if not file_extension:
-            content_type = response.headers.get('content-type', '')
+            content_type = headers.get('content-type', '')
             if 'pdf' in content_type:
                 file_extension = '.pdf'
             elif 'png' in content_type:
@@ -478,64 +875,31 @@ def process_url_with_gemini(file_url, prompt_text):
         
         # Save the file content to a temporary file
         with tempfile.NamedTemporaryFile(suffix=file_extension, delete=False) as temp_file:
-            temp_file.write(response.content)
+            temp_file.write(content)
             temp_file_path = temp_file.name
         
-        original_temp_path = temp_file_path
-        pdf_converted = False
-        
-        # Check if it's a DOCX file and convert to PDF
-        if file_extension in ['.docx', '.doc']:
-            try:
-                print(f"Converting {file_extension} to PDF...")
-                pdf_path = convert_docx_to_pdf(temp_file_path)
-                temp_file_path = pdf_path  # Use the converted PDF path
-                pdf_converted = True
-                print("Conversion successful!")
-            except Exception as e:
-                print(f"Warning: Could not convert {file_extension} to PDF: {str(e)}")
-                print("Proceeding with original file...")
-        
-        # Get MIME type (use PDF mime type if converted)
-        if pdf_converted:
-            mime_type = 'application/pdf'
-        else:
-            mime_type = SUPPORTED_FORMATS[file_extension]
-        
-        # Upload the file to Google AI
-        uploaded_file = genai.upload_file(
-            path=temp_file_path,
-            mime_type=mime_type,
-            display_name=f'Downloaded_File{file_extension}'
-        )
-        
-        # Wait for the file to be processed
-        while uploaded_file.state.name == "PROCESSING":
-            time.sleep(2)
-            uploaded_file = genai.get_file(uploaded_file.name)
-        
-        if uploaded_file.state.name == "FAILED":
-            raise ValueError(f"File processing failed: {uploaded_file.state}")
+        try:
+            # Convert if needed and upload the file to Google AI
+            uploaded_file = upload_file_to_gemini(temp_file_path, f'Downloaded_File{file_extension}', deadline)
+        finally:
+            # Clean up temporary file
+            os.unlink(temp_file_path)
         
         # Initialize the model
         model = genai.GenerativeModel('gemini-1.5-flash')
         
-        # Generate content with the uploaded file
-        ai_response = model.generate_content([uploaded_file, prompt_text])
-        
-        # Clean up - delete the uploaded file and temporary files
-        genai.delete_file(uploaded_file.name)
-        os.unlink(original_temp_path)
-        if pdf_converted and temp_file_path != original_temp_path:
-            try:
-                os.unlink(temp_file_path)
-            except Exception as e:
-                print(f"Warning: Could not delete temporary PDF file: {str(e)}")
+        # Generate content with the uploaded file, deleting it once every call has finished
+        ai_response = generate_with_deadline(
+            model, [uploaded_file, prompt_text], deadline, 'single',
+            on_finished=lambda: delete_uploaded_file(uploaded_file)
+        )
         
         return ai_response.text
         
     except httpx.RequestError as e:
         return f"Error downloading file: {str(e)}"
+    except TimeoutError:
+        raise
     except Exception as e:
         return f"Error processing file: {str(e)}"
 
@@ -547,6 +911,8 @@ def index():
 @app.route('/api/upload', methods=['POST'])
 def api_upload():
     """API endpoint for file upload"""
+    deadline = get_request_deadline()
+    
     try:
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -575,7 +941,7 @@ def api_upload():
                 prompt = get_prompt_for_file_type(temp_path)
             
             # Process file with Gemini
-            raw_result = process_file_with_gemini(temp_path, prompt, filename)
+            raw_result = process_file_with_gemini(temp_path, prompt, filename, deadline)
             
             # Clean the AI response
             parsed_json, cleaned_result = clean_ai_response(raw_result)
@@ -603,12 +969,92 @@ def api_upload():
                 os.unlink(temp_path)
             raise e
             
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/upload_bundle', methods=['POST'])
+def api_upload_bundle():
+    """API endpoint for extracting one applicant record from several documents"""
+    deadline = get_request_deadline()
+
+    try:
+        files = request.files.getlist('files')
+        custom_prompt = request.form.get('custom_prompt', '').strip()
+
+        if not files or all(file.filename == '' for file in files):
+            return jsonify({'error': 'No files provided'}), 400
+
+        if len(files) > MAX_BUNDLE_FILES:
+            return jsonify({'error': f'Too many files. A bundle can contain at most {MAX_BUNDLE_FILES} files'}), 400
+
+        for file in files:
+            if file.filename == '':
+                return jsonify({'error': 'No file selected'}), 400
+            if not validate_file_format(file.filename):
+                return jsonify({
+                    'error': f'Unsupported file format for {file.filename}. Supported formats: {", ".join(SUPPORTED_FORMATS.keys())}'
+                }), 400
+
+        # Save uploaded files into a temporary directory for this request
+        temp_dir = tempfile.mkdtemp()
+
+        try:
+            file_entries = []
+            for index, file in enumerate(files):
+                # Keep document names unique so fields can be attributed to their source
+                filename = get_unique_filename(file.filename, [name for _, name in file_entries])
+                # Give each file its own directory so a DOCX converted to PDF
+                # cannot overwrite another document (e.g. cv.docx and cv.pdf)
+                file_dir = os.path.join(temp_dir, str(index))
+                os.makedirs(file_dir)
+                temp_path = os.path.join(file_dir, filename)
+                file.save(temp_path)
+                file_entries.append((temp_path, filename))
+
+            # Get appropriate prompt
+            if custom_prompt:
+                prompt = custom_prompt
+            else:
+                prompt = get_bundle_prompt([path for path, _ in file_entries])
+
+            # Process all files with a single Gemini call
+            raw_result = process_bundle_with_gemini(file_entries, prompt, deadline)
+
+            # Clean the AI response
+            parsed_json, cleaned_result = clean_ai_response(raw_result)
+
+            print("Raw result:", raw_result)
+            print("Cleaned result:", cleaned_result)
+
+            # Return structured response
+            return jsonify({
+                'result': parsed_json if parsed_json else cleaned_result,
+                'documents': [filename for _, filename in file_entries],
+            })
+
+        finally:
+            # Clean up temporary files
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    except BundleDocumentError as e:
+        return jsonify({
+            'error': str(e),
+            'failed_documents': [
+                {'document': filename, 'error': str(error)} for filename, error in e.failures
+            ]
+        }), 422
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/process_url', methods=['POST'])
 def api_process_url():
     """API endpoint for URL processing"""
+    deadline = get_request_deadline()
+    
     try:
         data = request.get_json()
         file_url = data.get('file_url', '').strip()
@@ -619,7 +1065,6 @@ def api_process_url():
         
         # Download file from URL to temporary location
         try:
-            import urllib.request
             from urllib.parse import urlparse
             
             # Parse URL to get filename
@@ -640,7 +1085,9 @@ def api_process_url():
             temp_path = os.path.join(tempfile.gettempdir(), filename)
             
             # Download file
-            urllib.request.urlretrieve(file_url, temp_path)
+            content, _ = download_with_deadline(file_url, deadline)
+            with open(temp_path, 'wb') as temp_file:
+                temp_file.write(content)
             
             # Get appropriate prompt (same logic as api_upload)
             if custom_prompt:
@@ -649,7 +1096,7 @@ def api_process_url():
                 prompt = get_prompt_for_file_type(temp_path)
             
             # Process file with Gemini
-            raw_result = process_file_with_gemini(temp_path, prompt, filename)
+            raw_result = process_file_with_gemini(temp_path, prompt, filename, deadline)
             
             # Clean the AI response
             parsed_json, cleaned_result = clean_ai_response(raw_result)
@@ -677,6 +1124,8 @@ def api_process_url():
                 os.unlink(temp_path)
             raise e
         
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
@@ -686,7 +1135,10 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'supported_formats': list(SUPPORTED_FORMATS.keys()),
-        'max_file_size': '16MB'
+        'max_file_size': '16MB',
+        'request_deadline_seconds': REQUEST_DEADLINE_SECONDS,
+        'abandoned_calls': get_abandoned_call_stats(),
+        'hedging': get_hedge_stats()
     })
 
 if __name__ == '__main__':